@@ -22,27 +22,32 @@ class AuthenticatorTestCase(unittest.TestCase):
     def testDefaultValueOfApiKey(self):
         self.assertEqual(first=self.auth.api_key, second=None,
                          msg="Default value of api_key is not correct")
-    @mock.patch("os.path.isfile")
-    def testCreatingAuthenticatorFromFile(self, mock_isfile):
+    def testCreatingAuthenticatorFromFile(self):
         # Testing reading a key from file and creating an instance of Authenticator
 
-        mock_isfile.return_value = True
-
-        mock_open = mock.mock_open(read_data="apikey")
+        mock_open = mock.mock_open(read_data=b"apikey")
         with mock.patch("utils.authorization.open", mock_open):
             cls = authorization.Authenticator.from_file("mockname")
         self.assertIsInstance(cls, authorization.Authenticator,
                               msg=("Return of Authenticator.from_file is not an"
                                    "authenticator class"))
 
-    @mock.patch("os.path.isfile")
-    def testApikeyCreatedByFromFileConstructor(self, mock_isfile):
+    def testApikeyCreatedByFromFileConstructor(self):
         # Testing reading a key from file and creating an instance of Authenticator
 
-        mock_isfile.return_value = True
-
-        mock_open = mock.mock_open(read_data="apikey")
+        mock_open = mock.mock_open(read_data=b"apikey")
         with mock.patch("utils.authorization.open", mock_open):
             cls = authorization.Authenticator.from_file("mockname")
         self.assertEqual(cls.api_key, "apikey",
                          msg="Apikey created from from_file is not correct")
+
+    def testApikeyFromFileIsStripped(self):
+        mock_open = mock.mock_open(read_data=b"\xef\xbb\xbfapikey\r\n")
+        with mock.patch("utils.authorization.open", mock_open):
+            cls = authorization.Authenticator.from_file("mockname")
+        self.assertEqual(cls.api_key, "apikey",
+                         msg="Apikey read from a file kept the BOM or the trailing newline")
+
+    def testFromFileWithMissingFile(self):
+        with self.assertRaises(FileNotFoundError):
+            authorization.Authenticator.from_file("not/an/existing/file.txt")
@@ -0,0 +1,170 @@
+﻿import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+import utils.mod_download as mod_download
+
+import codecov
+
+
+class _FileHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a single file and records the methods of the requests."""
+    body = b"mod archive"
+    etag = '"v1"'
+    head_status = 200
+    # Bytes announced in Content-Length, which are never sent
+    missing_length = 0
+    methods = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_headers(self, status):
+        self.send_response(status)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(self.body) + self.missing_length))
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.methods.append("HEAD")
+        self._send_headers(self.head_status)
+
+    def do_GET(self):
+        self.methods.append("GET")
+        self._send_headers(200)
+        self.wfile.write(self.body)
+
+
+class FileDownloadTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FileHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = "http://127.0.0.1:{}/mod.7z?md5=abc".format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.write_folder = tempfile.mkdtemp() + os.sep
+        _FileHandler.methods = []
+        _FileHandler.etag = '"v1"'
+        _FileHandler.head_status = 200
+        _FileHandler.missing_length = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.write_folder)
+
+    def download(self):
+        with mock.patch("builtins.print"):
+            mod_download.download_with_progress_bar(self.url, self.write_folder)
+
+    def testFirstDownloadSkipsHead(self):
+        self.download()
+        self.assertEqual(["GET"], _FileHandler.methods,
+                         msg="A file, which was not downloaded yet, was asked for with HEAD.")
+        with open(self.write_folder + "mod.7z", "rb") as downloaded:
+            self.assertEqual(_FileHandler.body, downloaded.read())
+
+    def testFirstDownloadRemembersValidators(self):
+        self.download()
+        with open(self.write_folder + mod_download.CACHE_FILE_NAME, encoding="utf-8") as cache_file:
+            cached = json.load(cache_file)["mod.7z"]
+        self.assertEqual('"v1"', cached["etag"])
+        self.assertEqual(len(_FileHandler.body), cached["size"])
+
+    def testUnchangedFileIsSkipped(self):
+        self.download()
+        self.download()
+        self.assertEqual(["GET", "HEAD"], _FileHandler.methods,
+                         msg="An unchanged file was downloaded again.")
+
+    def testChangedFileIsDownloadedAgain(self):
+        self.download()
+        _FileHandler.etag = '"v2"'
+        self.download()
+        self.assertEqual(["GET", "HEAD", "GET"], _FileHandler.methods,
+                         msg="A changed file was not downloaded again.")
+
+    def testFailedHeadFallsBackToDownload(self):
+        self.download()
+        _FileHandler.head_status = 500
+        self.download()
+        self.assertEqual(["GET", "HEAD", "GET"], _FileHandler.methods,
+                         msg="A failed HEAD request did not fall back to the download.")
+
+    def testFileWithoutCacheEntryIsDownloaded(self):
+        self.download()
+        os.remove(self.write_folder + mod_download.CACHE_FILE_NAME)
+        self.download()
+        self.assertEqual(["GET", "GET"], _FileHandler.methods,
+                         msg="A file without a cache entry was not downloaded again.")
+
+    def testShortBodyLeavesNoPreallocatedTail(self):
+        _FileHandler.missing_length = 1000
+        with self.assertRaises(Exception):
+            self.download()
+        self.assertLessEqual(os.path.getsize(self.write_folder + "mod.7z"),
+                             len(_FileHandler.body),
+                             msg="Preallocated space was kept after a short download.")
+
+    def testDownloadManyWritesEveryFile(self):
+        base = "http://127.0.0.1:{}/".format(self.server.server_port)
+        downloader = mod_download.FileDownloader(write_folder=self.write_folder)
+        with mock.patch("builtins.print"):
+            downloader.download_many([base + "first.7z?md5=a", base + "second.7z?md5=b"])
+        for file_name in ("first.7z", "second.7z"):
+            with open(self.write_folder + file_name, "rb") as downloaded:
+                self.assertEqual(_FileHandler.body, downloaded.read())
+
+    def testDownloadManyRaisesErrorOfWorker(self):
+        downloader = mod_download.FileDownloader(write_folder=self.write_folder)
+        with mock.patch("builtins.print"), self.assertRaises(requests.ConnectionError):
+            downloader.download_many([self.url, "http://127.0.0.1:1/broken.7z?md5=c"])
+
+
+class PreallocateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output_file = tempfile.TemporaryFile()
+
+    def tearDown(self):
+        self.output_file.close()
+
+    def testFileIsPreallocated(self):
+        mod_download._preallocate(self.output_file, 1000)
+        self.assertEqual(1000, os.fstat(self.output_file.fileno()).st_size)
+        self.assertEqual(0, self.output_file.tell())
+
+    @unittest.skipUnless(hasattr(os, "posix_fallocate"), "posix_fallocate is not available")
+    def testFallbackWithoutFallocateSupport(self):
+        with mock.patch("os.posix_fallocate", side_effect=OSError):
+            mod_download._preallocate(self.output_file, 1000)
+        self.assertEqual(1000, os.fstat(self.output_file.fileno()).st_size)
+        self.assertEqual(0, self.output_file.tell())
+
+
+class GetModNameFromUrlTestCase(unittest.TestCase):
+    def testNexusUrl(self):
+        url = ("https://files.nexus-cdn.com/110/3863/SkyUI_5_1-3863-5-1.7z"
+               "?md5=5yKmT54-6qBhgCjAYwUuxg&expires=1552787172&user_id=522107")
+        self.assertEqual("SkyUI_5_1-3863-5-1.7z", mod_download.get_mod_name_from_url(url))
+
+    def testNameEndsBeforeLastQuestionMark(self):
+        self.assertEqual("a?b", mod_download.get_mod_name_from_url("https://host/a?b?c"))
+
+    def testUrlWithoutQueryString(self):
+        with self.assertRaises(ValueError):
+            mod_download.get_mod_name_from_url("https://host/file.7z")
+
+    def testUrlWithoutFileName(self):
+        with self.assertRaises(ValueError):
+            mod_download.get_mod_name_from_url("https://host/?md5=abc")
@@ -1,4 +1,5 @@
 ﻿import unittest
+from unittest import mock
 import utils.mod_import as mod_import
 
 import codecov
@@ -7,6 +8,8 @@ import codecov
 class ModListImporterTestCase(unittest.TestCase):
     def setUp(self):
         self.importer = mod_import.ModListImporter()
+        mod_import._load_csv.cache_clear()
+        mod_import._load_excel.cache_clear()
         self.csv_header = "modids,names\n"
         self.csv_values = ["1,abc\n"
                            "2,def\n"]
@@ -36,9 +39,117 @@ class ModListImporterTestCase(unittest.TestCase):
                          cls.mod_list,
                          msg="ModImporter succesfully created, but mod_list is incorrect.")
 
+    def testImportFromCSVWithoutHeader(self):
+        cls = self.importer.from_csv("test/testModImporterFromCSVWithoutHeader.csv")
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="First row without a header was not imported as a mod id.")
+
+    @mock.patch.object(mod_import, "_HAS_PANDAS", False)
+    def testImportFromCSVWithoutPandas(self):
+        cls = self.importer.from_csv("test/testModImporterFromCSV.csv")
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="csv module fallback returned an incorrect mod_list.")
+
+    def testImportFromSmallCSVSkipsPandas(self):
+        with mock.patch.object(mod_import, "_read_csv_column_pandas") as read_pandas:
+            cls = self.importer.from_csv("test/testModImporterFromCSV.csv")
+        read_pandas.assert_not_called()
+        self.assertEqual([1, 2], cls.mod_list)
+
+    @unittest.skipUnless(mod_import._HAS_PANDAS, "pandas is not installed")
+    @mock.patch.object(mod_import, "_PANDAS_CSV_MIN_SIZE", 0)
+    def testImportFromLargeCSVWithPandas(self):
+        with mock.patch.object(mod_import, "_read_csv_column_pandas",
+                               wraps=mod_import._read_csv_column_pandas) as read_pandas:
+            cls = self.importer.from_csv("test/testModImporterFromCSV.csv")
+        read_pandas.assert_called_once()
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="pandas reader returned an incorrect mod_list.")
+
     def testImportFromExcel(self):
         cls = self.importer.from_excel("test/testModImporterFromExcel.xlsx")
         self.assertIsInstance(cls, mod_import.ModListImporter)
         self.assertEqual([1, 2],
                          cls.mod_list,
                          msg="ModImporter succesfully created, but mod_list is incorrect.")
+
+    @mock.patch.object(mod_import, "_HAS_CALAMINE", False)
+    def testImportFromExcelWithoutCalamine(self):
+        cls = self.importer.from_excel("test/testModImporterFromExcel.xlsx")
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="pandas with openpyxl engine returned an incorrect mod_list.")
+
+    @unittest.skipUnless(mod_import._HAS_PANDAS, "pandas is not installed")
+    def testImportFromExcelWithPandasWithoutCalamineEngine(self):
+        import pandas
+        with mock.patch.object(pandas, "__version__", "2.1.4"), \
+                mock.patch.object(pandas, "read_excel", wraps=pandas.read_excel) as read_excel:
+            cls = self.importer.from_excel("test/testModImporterFromExcel.xlsx")
+        self.assertEqual("openpyxl", read_excel.call_args.kwargs["engine"],
+                         msg="pandas older than 2.2 was asked for the calamine engine.")
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="pandas with openpyxl engine returned an incorrect mod_list.")
+
+    @mock.patch.object(mod_import, "_HAS_PANDAS", False)
+    @mock.patch.object(mod_import, "_HAS_CALAMINE", False)
+    def testImportFromExcelWithOpenpyxlOnly(self):
+        cls = self.importer.from_excel("test/testModImporterFromExcel.xlsx")
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="openpyxl fallback returned an incorrect mod_list.")
+
+    @mock.patch.object(mod_import, "_HAS_PANDAS", False)
+    def testImportFromExcelSecondColumnWithCalamine(self):
+        cls = self.importer.from_excel("test/testModImporterFromExcelSecondColumn.xlsx",
+                                       modid_column=1)
+        self.assertEqual([10, 20],
+                         cls.mod_list,
+                         msg="calamine reader skipped the empty first column.")
+
+    @mock.patch.object(mod_import, "_HAS_PANDAS", False)
+    @mock.patch.object(mod_import, "_HAS_CALAMINE", False)
+    def testImportFromExcelSecondColumnWithOpenpyxlOnly(self):
+        cls = self.importer.from_excel("test/testModImporterFromExcelSecondColumn.xlsx",
+                                       modid_column=1)
+        self.assertEqual([10, 20],
+                         cls.mod_list,
+                         msg="openpyxl fallback read an incorrect column.")
+
+    @unittest.skipUnless(mod_import._HAS_PANDAS, "pandas is not installed")
+    def testImportFromExcelFirstSheetWithPandas(self):
+        import pandas
+        with mock.patch.object(pandas, "read_excel", wraps=pandas.read_excel) as read_excel:
+            cls = self.importer.from_excel("test/testModImporterFromExcelActiveSheet.xlsx")
+        self.assertEqual(0, read_excel.call_args.kwargs["sheet_name"])
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="pandas reader did not read the first sheet.")
+
+    @mock.patch.object(mod_import, "_HAS_PANDAS", False)
+    def testImportFromExcelFirstSheetWithCalamine(self):
+        cls = self.importer.from_excel("test/testModImporterFromExcelActiveSheet.xlsx")
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="calamine reader did not read the first sheet.")
+
+    @mock.patch.object(mod_import, "_HAS_PANDAS", False)
+    @mock.patch.object(mod_import, "_HAS_CALAMINE", False)
+    def testImportFromExcelFirstSheetWithOpenpyxlOnly(self):
+        cls = self.importer.from_excel("test/testModImporterFromExcelActiveSheet.xlsx")
+        self.assertEqual([1, 2],
+                         cls.mod_list,
+                         msg="openpyxl fallback read the active sheet instead of the first one.")
+
+    def testImportFromCSVIsCached(self):
+        first = self.importer.from_csv("test/testModImporterFromCSV.csv")
+        second = self.importer.from_csv("test/testModImporterFromCSV.csv")
+        self.assertEqual(first.mod_list, second.mod_list)
+        self.assertIsNot(first.mod_list, second.mod_list,
+                         msg="Importers created from the same file share a mod_list.")
+        self.assertEqual(mod_import._load_csv.cache_info().hits, 1,
+                         msg="Second import of an unchanged file was not cached.")
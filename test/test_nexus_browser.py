@@ -0,0 +1,36 @@
+﻿import unittest
+
+import utils.nexus_browser as nexus_browser
+
+import codecov
+
+
+class NexusBrowserTestCase(unittest.TestCase):
+    def testUnknownDomainName(self):
+        with self.assertRaises(ValueError):
+            nexus_browser.NexusBrowser(domain_name="notagame")
+
+    def testLinksOfDomainNameFromInit(self):
+        browser = nexus_browser.NexusBrowser(file_ids=[1, 2], domain_name="skyrim")
+        links = browser._generate_downloadpage_links_from_file_ids([1, 2], "skyrim")
+        self.assertEqual(["https://www.nexusmods.com/Core/Libs/Common/Widgets/DownloadPopUp"
+                          "?id={}&game_id=110&source=FileExpander".format(file_id)
+                          for file_id in (1, 2)],
+                         links)
+
+    def testLinksOfOtherDomainName(self):
+        browser = nexus_browser.NexusBrowser(domain_name="skyrim")
+        links = browser._generate_downloadpage_links_from_file_ids([1], "morrowind")
+        self.assertIn("&game_id=100&", links[0],
+                      msg="Links were generated with the game id of the domain from __init__.")
+
+    def testLinksOfUnknownDomainName(self):
+        browser = nexus_browser.NexusBrowser(domain_name="skyrim")
+        with self.assertRaises(ValueError):
+            browser._generate_downloadpage_links_from_file_ids([1], "notagame")
+
+    def testLinksWithoutDomainName(self):
+        browser = nexus_browser.NexusBrowser(file_ids=[1])
+        with self.assertRaises(ValueError,
+                               msg="Links were generated with game_id=None."):
+            browser._generate_downloadpage_links_from_file_ids([1], None)
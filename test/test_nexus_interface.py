@@ -0,0 +1,195 @@
+﻿import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+import utils.authorization as authorization
+import utils.mod_import as mod_import
+import utils.nexus_interface as nexus_interface
+import utils.nexus_queries as nexus_queries
+
+import codecov
+
+
+def make_response(status_code: int, body=None, headers: dict = None) -> requests.Response:
+    # Responses are kept out of the in-memory response cache of nexus_queries
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b"" if body is None else json.dumps(body).encode()
+    response._content_consumed = True
+    response.headers.update({"Cache-Control": "no-store"})
+    response.headers.update(headers or {})
+    return response
+
+
+class NexusInterfaceTestCase(unittest.TestCase):
+    def setUp(self):
+        # NexusInterface writes into profile/ in the working directory
+        self.old_cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        nexus_interface._VALIDATIONS.clear()
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.work_dir)
+        nexus_interface._VALIDATIONS.clear()
+
+    def make_interface(self, request) -> nexus_interface.NexusInterface:
+        interface = nexus_interface.NexusInterface(authorization.Authenticator("apikey"))
+        interface._session.request = request
+        return interface
+
+    def testValidationIsSharedBetweenInterfaces(self):
+        request = mock.Mock(return_value=make_response(200, {"name": "user"}))
+        first = self.make_interface(request).authenticate()
+        second = self.make_interface(request).authenticate()
+        self.assertEqual(1, request.call_count,
+                         msg="A validated key was sent to Nexus again by a new interface.")
+        self.assertIs(first, second)
+
+    def testFailedValidationIsNotCached(self):
+        request = mock.Mock(return_value=make_response(401, {"message": "bad key"}))
+        with mock.patch("builtins.print"):
+            self.make_interface(request).authenticate()
+            self.make_interface(request).authenticate()
+        self.assertEqual(2, request.call_count,
+                         msg="A failed validation was cached.")
+
+
+class NexusInterfaceCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        # NexusInterface writes into profile/ in the working directory
+        self.old_cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        self.request = mock.Mock()
+        self.interface = nexus_interface.NexusInterface(authorization.Authenticator("apikey"))
+        self.interface._session.request = self.request
+        self.importer = mod_import.ModListImporter([1])
+        self.body_path = os.path.join("profile", ".cache", "skyrim", "mods", "1.json")
+        self.etag_path = self.body_path + ".etag"
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.work_dir)
+
+    def import_mod_info(self, *responses) -> dict:
+        self.request.reset_mock()
+        self.request.side_effect = list(responses)
+        return self.interface.import_mod_info(self.importer, "skyrim")
+
+    def make_stale(self):
+        os.utime(self.body_path, (0, 0))
+
+    def sent_etag(self):
+        return self.request.call_args.kwargs["headers"].get("if-none-match")
+
+    def testResponseIsCachedWithEtag(self):
+        mod_infos = self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        self.assertEqual({1: {"mod_id": 1}}, mod_infos)
+        with open(self.body_path, encoding="utf-8") as body_file:
+            self.assertEqual({"mod_id": 1}, json.load(body_file))
+        with open(self.etag_path, encoding="utf-8") as etag_file:
+            self.assertEqual('"v1"', etag_file.read())
+
+    def testFreshResponseIsNotRequested(self):
+        self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        mod_infos = self.import_mod_info()
+        self.assertEqual({1: {"mod_id": 1}}, mod_infos)
+        self.request.assert_not_called()
+
+    def testNotModifiedReusesStaleResponse(self):
+        self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        self.make_stale()
+        mod_infos = self.import_mod_info(make_response(304))
+        self.assertEqual('"v1"', self.sent_etag())
+        self.assertEqual({1: {"mod_id": 1}}, mod_infos)
+        self.assertGreater(os.path.getmtime(self.body_path), 0,
+                           msg="Revalidated response did not start a new cache_ttl.")
+
+    def testModifiedResponseReplacesStaleResponse(self):
+        self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        self.make_stale()
+        mod_infos = self.import_mod_info(make_response(200, {"mod_id": 1, "version": 2},
+                                                     {"ETag": '"v2"'}))
+        self.assertEqual({1: {"mod_id": 1, "version": 2}}, mod_infos)
+        with open(self.etag_path, encoding="utf-8") as etag_file:
+            self.assertEqual('"v2"', etag_file.read())
+
+    def testCorruptResponseIsNotRevalidated(self):
+        self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        with open(self.body_path, "wb") as body_file:
+            body_file.write(b"{not json")
+        self.make_stale()
+        mod_infos = self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        self.assertIsNone(self.sent_etag(),
+                          msg="ETag of an unreadable cached response was sent.")
+        self.assertEqual({1: {"mod_id": 1}}, mod_infos)
+
+    def testMissingResponseIsNotRevalidated(self):
+        self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        os.remove(self.body_path)
+        mod_infos = self.import_mod_info(make_response(200, {"mod_id": 1}))
+        self.assertIsNone(self.sent_etag(),
+                          msg="ETag of a removed cached response was sent.")
+        self.assertEqual({1: {"mod_id": 1}}, mod_infos)
+        self.assertFalse(os.path.exists(self.etag_path),
+                         msg="ETag of a removed cached response was kept.")
+
+    def testFailedRequestFallsBackToStaleResponse(self):
+        self.import_mod_info(make_response(200, {"mod_id": 1}, {"ETag": '"v1"'}))
+        self.make_stale()
+        with mock.patch.object(nexus_queries._log, "warning"):
+            mod_infos = self.import_mod_info(requests.ConnectionError("offline"))
+        self.assertEqual({1: {"mod_id": 1}}, mod_infos)
+
+    def testFailedRequestSkipsMod(self):
+        def answer(method, url, **kwargs):
+            if url.endswith("/1.json"):
+                raise requests.ConnectionError("offline")
+            return make_response(200, {"mod_id": 2})
+
+        self.request.side_effect = answer
+        with mock.patch.object(nexus_queries._log, "warning"):
+            mod_infos = self.interface.import_mod_info(mod_import.ModListImporter([1, 2]),
+                                                       "skyrim")
+        self.assertEqual({2: {"mod_id": 2}}, mod_infos)
+        with open(os.path.join("profile", "mod_infos.json"), encoding="utf-8") as mod_infos_file:
+            self.assertEqual({"2": {"mod_id": 2}}, json.load(mod_infos_file))
+
+
+class ImportUpdatedModIdsTestCase(unittest.TestCase):
+    def setUp(self):
+        # NexusInterface writes into profile/ in the working directory
+        self.old_cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        self.request = mock.Mock(return_value=make_response(200, [
+            {"mod_id": 3, "latest_file_update": 1, "latest_mod_activity": 1},
+            {"mod_id": 1, "latest_file_update": 1, "latest_mod_activity": 1},
+            {"mod_id": 7, "latest_file_update": 1, "latest_mod_activity": 1},
+        ]))
+        self.interface = nexus_interface.NexusInterface(authorization.Authenticator("apikey"))
+        self.interface._session.request = self.request
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.work_dir)
+
+    def testPeriodIsSent(self):
+        self.interface.import_updated_mod_ids(mod_import.ModListImporter([1]), "skyrim", "1d")
+        self.assertEqual(1, self.request.call_count)
+        method, url = self.request.call_args.args
+        self.assertEqual("https://api.nexusmods.com/v1/games/skyrim/mods/updated.json", url)
+        self.assertEqual({"period": "1d"}, self.request.call_args.kwargs["params"])
+
+    def testUpdatedIdsAreFilteredByModList(self):
+        updated = self.interface.import_updated_mod_ids(mod_import.ModListImporter([1, 2, 3]),
+                                                        "skyrim")
+        self.assertEqual([1, 3], updated,
+                         msg="Updated mods are not the mods of the list in its order.")
@@ -0,0 +1,236 @@
+﻿import http.server
+import io
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+from urllib3.util.retry import Retry
+
+import utils.nexus_queries as nexus_queries
+
+import codecov
+
+
+def make_response(body: bytes) -> requests.Response:
+    # A response with its body still unread, like the one of a streamed request
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class NexusQueryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.query = nexus_queries.NexusQuery(headers={"apikey": "apikey",
+                                                       "accept": "application/json"},
+                                              session=self.session)
+        self.cache = nexus_queries._ResponseCache()
+        patcher = mock.patch.object(nexus_queries, "_RESPONSE_CACHE", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testStreamedResponseIsNotConsumed(self):
+        self.session.request.return_value = make_response(b'{"name": "user"}')
+        response = self.query.query("users/validate.json", stream=True)
+        self.assertTrue(self.session.request.call_args.kwargs["stream"])
+        self.assertFalse(response._content_consumed,
+                         msg="The body of a streamed response was read by query.")
+        self.assertFalse(response.raw.closed,
+                         msg="A streamed response was closed by query.")
+        self.assertEqual(b'{"name": "user"}', response.content)
+
+    def testStreamedResponseIsNotCached(self):
+        self.session.request.return_value = make_response(b"{}")
+        self.query.query("users/validate.json", stream=True)
+        self.session.request.return_value = make_response(b"{}")
+        self.query.query("users/validate.json", stream=True)
+        self.assertEqual(2, self.session.request.call_count,
+                         msg="A streamed response was answered from the response cache.")
+        self.assertEqual({}, self.cache._entries)
+
+    def testResponseIsCached(self):
+        self.session.request.return_value = make_response(b"{}")
+        first = self.query.query("users/validate.json")
+        second = self.query.query("users/validate.json")
+        self.assertEqual(1, self.session.request.call_count,
+                         msg="A repeated GET query was not answered from the response cache.")
+        self.assertIs(first, second)
+
+
+class ModFileQueryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.session.request.side_effect = lambda *args, **kwargs: make_response(b"[]")
+        self.query = nexus_queries.ModFileQuery(game_domain="skyrim",
+                                                headers={"apikey": "apikey",
+                                                         "accept": "application/json"},
+                                                session=self.session)
+        patcher = mock.patch.object(nexus_queries, "_RESPONSE_CACHE",
+                                    nexus_queries._ResponseCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sent_urls(self) -> list:
+        return [call.args[1] for call in self.session.request.call_args_list]
+
+    def testGenerateLinkKeepsUrl(self):
+        self.query.generate_link(mod_id=1, file_id=2)
+        self.assertIsNone(self.query.url,
+                          msg="generate_link changed the url shared by the threads.")
+        self.assertEqual(["https://api.nexusmods.com/v1/games/skyrim/mods/1/files/2/download_link.json"],
+                         self.sent_urls())
+
+
+class _FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """Answers 503 to the first requests and 200 to the rest."""
+    failures = 0
+    requests = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        type(self).requests += 1
+        status = 503 if self.requests <= self.failures else 200
+        body = b"{}"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class JitteredRetryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.retry = nexus_queries._JitteredRetry(total=3, backoff_factor=1.0)
+
+    def testBackoffIsJittered(self):
+        with mock.patch.object(Retry, "get_backoff_time", return_value=4), \
+                mock.patch("random.random", return_value=0.0):
+            self.assertEqual(4, self.retry.get_backoff_time())
+        with mock.patch.object(Retry, "get_backoff_time", return_value=4), \
+                mock.patch("random.random", return_value=0.999):
+            backoff = self.retry.get_backoff_time()
+        self.assertGreater(backoff, 4)
+        self.assertLessEqual(backoff, 4 * (1 + nexus_queries._JitteredRetry.JITTER))
+
+    def testBackoffIsCapped(self):
+        with mock.patch.object(Retry, "get_backoff_time", return_value=100), \
+                mock.patch("random.random", return_value=0.999):
+            self.assertEqual(nexus_queries._JitteredRetry.MAX_BACKOFF,
+                             self.retry.get_backoff_time())
+
+    def testIncrementKeepsSubclass(self):
+        retry = self.retry.increment(method="GET", url="/")
+        self.assertIsInstance(retry, nexus_queries._JitteredRetry,
+                              msg="urllib3 replaced the retry with a plain Retry.")
+
+    @mock.patch.object(nexus_queries._JitteredRetry, "MAX_BACKOFF", 0)
+    def testSessionRetriesUnavailableServer(self):
+        _FlakyHandler.failures = 1
+        _FlakyHandler.requests = 0
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        session = nexus_queries.create_session()
+        session.mount("http://", session.get_adapter("https://"))
+        with session:
+            response = session.get("http://127.0.0.1:{}/".format(server.server_port))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, _FlakyHandler.requests)
+
+
+class GenerateLinksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.session.request.side_effect = self.answer
+        self.query = nexus_queries.ModFileQuery(game_domain="skyrim",
+                                                headers={"apikey": "apikey",
+                                                         "accept": "application/json"},
+                                                session=self.session)
+        patcher = mock.patch.object(nexus_queries, "_RESPONSE_CACHE",
+                                    nexus_queries._ResponseCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def answer(method, url, **kwargs) -> requests.Response:
+        # Links of mod 3 cannot be generated, the others link to "{mod}-{file}.7z"
+        mod_id, file_id = url.split("/mods/")[1].split("/files/")
+        file_id = file_id.split("/")[0]
+        if mod_id == "3":
+            response = make_response(b"{}")
+            response.status_code = 404
+            return response
+        body = '[{{"URI": "https://cdn/{}-{}.7z?md5=a"}}]'.format(mod_id, file_id)
+        response = make_response(body.encode())
+        # Without stream=True requests reads the body before returning
+        response.content
+        return response
+
+    def testPairsMapToTheirResponses(self):
+        results = dict(self.query.generate_links([(1, 10), (2, 20)]))
+        self.assertEqual({(1, 10), (2, 20)}, set(results))
+        for (mod_id, file_id), response in results.items():
+            self.assertEqual("https://cdn/{}-{}.7z?md5=a".format(mod_id, file_id),
+                             response.json()[0]["URI"])
+
+    def testDownloadUrlsSkipFailedLinks(self):
+        with mock.patch.object(nexus_queries._log, "warning"):
+            urls = set(self.query.generate_download_urls([(1, 10), (2, 20), (3, 30)]))
+        self.assertEqual({"https://cdn/1-10.7z?md5=a", "https://cdn/2-20.7z?md5=a"}, urls)
+
+
+class QueryManyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most_running = 0
+        self.session = mock.Mock()
+        self.session.request.side_effect = self.answer
+        self.query = nexus_queries.NexusQuery(headers={"apikey": "apikey",
+                                                       "accept": "application/json"},
+                                              session=self.session)
+        patcher = mock.patch.object(nexus_queries, "_RESPONSE_CACHE",
+                                    nexus_queries._ResponseCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def answer(self, method, url, **kwargs) -> requests.Response:
+        # The earlier urls are answered later, "mods/{n}.json" waits (8 - n) ms
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        number = int(url.rsplit("/", 1)[1].split(".")[0])
+        time.sleep((8 - number) / 1000)
+        with self.lock:
+            self.running -= 1
+        response = make_response(str(number).encode())
+        response.content
+        return response
+
+    def testResponsesKeepOrderOfUrls(self):
+        urls = ["mods/{}.json".format(number) for number in range(8)]
+        responses = self.query.query_many(urls, max_workers=8)
+        self.assertEqual([str(number).encode() for number in range(8)],
+                         [response.content for response in responses])
+
+    def testConcurrencyIsBounded(self):
+        urls = ["mods/{}.json".format(number) for number in range(8)]
+        self.query.query_many(urls, max_workers=3)
+        self.assertLessEqual(self.most_running, 3)
+        self.assertGreater(self.most_running, 1,
+                           msg="The requests were not sent concurrently.")
+
+    def testEveryUrlGetsItsOwnHeaders(self):
+        urls = ["mods/{}.json".format(number) for number in range(3)]
+        url_headers = [{"apikey": "apikey", "accept": "application/json", "if-none-match": str(number)}
+                       for number in range(3)]
+        self.query.query_many(urls, url_headers=url_headers)
+        sent = {call.args[1].rsplit("/", 1)[1]: call.kwargs["headers"]["if-none-match"]
+                for call in self.session.request.call_args_list}
+        self.assertEqual({"0.json": "0", "1.json": "1", "2.json": "2"}, sent)
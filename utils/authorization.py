@@ -19,7 +19,6 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
-import os
 
 
 class Authenticator:
@@ -35,10 +34,12 @@ class Authenticator:
         :type file_name: str
         :param file_name: a str object with name of the .txt file containing the API key
         """
-        assert os.path.isfile(file_name), "{file_name} is not a valid path to a file"
-
-        with open(file_name, 'rt', encoding="utf-8-sig") as file:
-            key = file.read()
+        # The key is stripped of the trailing newline, which would break the headers
+        try:
+            with open(file_name, 'rb') as file:
+                key = file.read().decode("utf-8-sig").strip()
+        except FileNotFoundError as error:
+            raise FileNotFoundError("{} is not a valid path to a file".format(file_name)) from error
         return cls(key)
 
     @property
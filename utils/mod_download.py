@@ -22,10 +22,22 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import functools
+import json
 import os
-import re
-import requests
-import tqdm
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+# requests and tqdm are imported on the first download, together with the session
+# shared between downloads, so the connections to the file servers are kept alive
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# Name of the file in write_folder remembering the already downloaded files
+CACHE_FILE_NAME = ".nm_cache.json"
+_CACHE_LOCK = threading.Lock()
 
 class FileDownloader():
     """Handles downloading files from a URL.
@@ -62,10 +74,31 @@ class FileDownloader():
         assert isinstance(write_folder, str), "Path {} is not a str object.".format(write_folder)
         return download_with_progress_bar(url, write_folder)
 
+    def download_many(self,
+                      urls: Iterable[str],
+                      max_workers: int = 8):
+        """Downloads the files from the URLs concurrently.
+
+        Args:
+            urls: urls to the downloaded files. A download starts as soon as
+                its url is produced, so a generator of urls, like
+                ModFileQuery.generate_download_urls, is not waited for
+            max_workers: maximum number of files downloaded at the same time
+
+        Returns:
+
+        """
+        download = functools.partial(download_with_progress_bar,
+                                     write_folder=self.write_folder)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Consuming the results re-raises the errors from the worker threads
+            list(executor.map(download, urls))
+
 def download_with_progress_bar(url: str,
                                write_folder: str):
     """Downloads the file from the URL.
-    It does it with a pretty progress bar curtosy of tqdm!
+    It does it with a pretty progress bar curtosy of tqdm! Files already
+    downloaded into write_folder with the same ETag and size are skipped.
 
     Args:
         url: url to the downloaded file
@@ -86,17 +119,134 @@ def download_with_progress_bar(url: str,
                "Using the url as the file name.").format(error))
         file_name = url
 
+    import requests
+    import tqdm
+
+    # Skipping the download if the same file was already downloaded
+    # The server is only asked, when there is a file to compare with
+    session = get_session()
+    path = write_folder + file_name
+    if os.path.exists(path):
+        with _CACHE_LOCK:
+            cached = _load_download_cache(write_folder).get(file_name)
+        if cached is not None:
+            try:
+                head = session.head(url, allow_redirects=True, timeout=5)
+            except requests.exceptions.RequestException:
+                # Leaving the decision to the download itself
+                head = None
+            if head is not None and head.ok:
+                validator = _get_validator(head.headers)
+                if validator is not None and \
+                        cached == dict(validator, mtime=os.path.getmtime(path)):
+                    print("{} is already downloaded.".format(file_name))
+                    return
+
     # File download
-    with open(write_folder + file_name, "wb") as output_file:
-        response = requests.get(url, stream=True, timeout=5)
-        chunk_size = 1024*1024
-        for data in tqdm.tqdm(response.iter_content(chunk_size=chunk_size),
-                              unit="MB",
-                              desc=file_name):
-            output_file.write(data)
+    with session.get(url, stream=True, timeout=5) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        validator = _get_validator(response.headers)
+        # Content-Length counts the encoded bytes, it is only the total of the
+        # decoded stream when the response is not compressed
+        total = None
+        if "Content-Encoding" not in response.headers:
+            total = int(response.headers.get("Content-Length", 0)) or None
+        with open(path, "wb") as output_file, \
+                tqdm.tqdm.wrapattr(response.raw, "read",
+                                   total=total,
+                                   desc=file_name,
+                                   unit="B",
+                                   unit_scale=True) as source:
+            if total:
+                _preallocate(output_file, total)
+            try:
+                shutil.copyfileobj(source, output_file, length=1024*1024)
+            finally:
+                # Cutting off the preallocated space, if fewer bytes arrived
+                # or the download broke off
+                output_file.truncate()
+
+    # Remembering the downloaded file with the validators of the download
+    if validator is not None:
+        with _CACHE_LOCK:
+            cache = _load_download_cache(write_folder)
+            cache[file_name] = dict(validator, mtime=os.path.getmtime(path))
+            with open(write_folder + CACHE_FILE_NAME, "wt", encoding="utf-8") as cache_file:
+                json.dump(obj=cache, fp=cache_file)
 
     # return True
 
+def _preallocate(output_file, size: int):
+    """Reserves the disk space for a downloaded file in one go.
+    Lets the filesystem place a large file in few contiguous extents.
+
+    Args:
+        output_file: file opened for binary writing
+        size: expected size of the file in bytes
+
+    Returns:
+
+    """
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(output_file.fileno(), 0, size)
+            return
+        except OSError:
+            # Filesystems without fallocate support
+            pass
+    output_file.truncate(size)
+    output_file.seek(0)
+
+def get_session():
+    """Returns the requests.Session shared by all the downloads.
+    The session is created on the first call.
+
+    Returns:
+        requests.Session
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _SESSION = requests.Session()
+            _SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+    return _SESSION
+
+def _get_validator(headers) -> dict:
+    """Extracts the headers identifying a version of a file from a response.
+
+    Args:
+        headers: headers of a HEAD or GET response for the file
+
+    Returns:
+        dict of "etag" and "size" or None, if the response has neither of them
+    """
+    validator = {
+        "etag": headers.get("ETag"),
+        "size": int(headers.get("Content-Length", -1)),
+    }
+    if validator["etag"] is None and validator["size"] == -1:
+        return None
+    return validator
+
+def _load_download_cache(write_folder: str) -> dict:
+    """Loads the information about the files already downloaded into a folder.
+
+    Args:
+        write_folder: folder the files were downloaded into
+
+    Returns:
+        dict of file name: {"etag", "size", "mtime"} of the downloaded file
+    """
+    try:
+        with open(write_folder + CACHE_FILE_NAME, "rt", encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
 def get_mod_name_from_url(url: str) -> str:
     """Extracts the file name from the url.
 
@@ -112,16 +262,12 @@ def get_mod_name_from_url(url: str) -> str:
         >>> "user_id=522107&rip=31.183.199.94"))
         SkyUI_5_1-3863-5-1.7z
     """
-    # Splitting the url into parts on '/' and getting the last part containing the file name
-    last_part = url.split(sep="/")[-1]
-
-    # Regex search for the file name
-    pattern = r"^.+(?=\?)"
-    regex = re.compile(pattern=pattern)
-    match = re.match(regex, last_part)
-    if match:
-        file_name = match[0]
-    else:
+    # Getting the last part of the url containing the file name
+    last_part = url.rsplit("/", 1)[-1]
+
+    # The file name is everything before the last "?"
+    file_name, separator, _ = last_part.rpartition("?")
+    if not separator or not file_name:
         raise ValueError(("Could not find the file name in"
                           " the last part of the url {}.").format(last_part))
     return file_name
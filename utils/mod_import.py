@@ -24,8 +24,20 @@
 It contains all the classes, which are responsible for importing
 mod ids and mod names.
 """
+import array
 import csv
-import openpyxl
+import functools
+import importlib.util
+import operator
+import os
+
+# The spreadsheet and dataframe backends are slow to import, so they are
+# imported only when a mod list is read. Here only their availability is checked.
+_HAS_PANDAS = importlib.util.find_spec("pandas") is not None
+_HAS_CALAMINE = importlib.util.find_spec("python_calamine") is not None
+
+# Smaller .csv files are read faster with the csv module than pandas is imported
+_PANDAS_CSV_MIN_SIZE = 1 << 20
 
 
 class ModListImporter:
@@ -61,32 +73,15 @@ class ModListImporter:
         Returns:
             mod_import.ModListImporter
         """
-        modid_array = []
-
-        with open(file_name, newline="") as csvfile:
-            # Recognizes the dialect of the file and whether it has headers
-            dialect = csv.Sniffer().sniff(csvfile.readline())
-            csvfile.seek(0)
-            has_headers = csv.Sniffer().has_header(csvfile.read(1024))
-            csvfile.seek(0)
-
-            # Check for column names
-            if has_headers:
-                fieldnames = csvfile.readline()
-
-            # Reads the modids and adds to modid_array
-            csv_reader = csv.reader(csvfile, dialect=dialect)
-            for row in csv_reader:
-                modid_array.append(int(row[modid_column]))
-
-        modid_array = list(modid_array)
-        assert isinstance(modid_array, list), "modid_array is not a list. Expected a list."
-        return cls(modid_array)
+        modid_array = _load_csv(*_file_key(file_name), modid_column)
+        return cls(modid_array.tolist())
 
     @classmethod
     def from_excel(cls, file_name: str, modid_column: int = 0):
         """Imports a list of mod ids from an .xlsx file
-        Mod ids defined by Nexus Mods site.
+        Mod ids defined by Nexus Mods site. Uses pandas and python-calamine
+        when they are installed and falls back to openpyxl otherwise.
+        The mod ids are read from the first sheet of the file.
 
         Args:
             file_name (str): name of the .xlsx file
@@ -95,25 +90,8 @@ class ModListImporter:
         Returns:
             mod_import.ModListImporter: an instance of ModListImporter with mod ids already imported
         """
-        modid_array = []
-
-        book = openpyxl.load_workbook(filename=file_name,
-                                      read_only=True)
-        sheet = book.active
-
-        # Read in a header
-        fieldnames = []
-        fieldnames_row = next(sheet.rows)
-        for cell in fieldnames_row:
-            fieldnames.append(cell.value)
-
-        # Read in modids
-        for row in sheet.rows:
-            modid_array.append(row[modid_column].value)
-
-        modid_array = list(modid_array)
-        assert isinstance(modid_array, list)
-        return cls(modid_array)
+        modid_array = _load_excel(*_file_key(file_name), modid_column)
+        return cls(modid_array.tolist())
 
     @property
     def mod_list(self):
@@ -139,3 +117,181 @@ class ModListImporter:
 
     def _set_mod_list(self, value: list):
         self._mod_list = value
+
+
+def _file_key(file_name: str) -> tuple:
+    """Identifies a version of a file for the caches of the imported mod ids.
+
+    Args:
+        file_name (str): path to the file
+
+    Returns:
+        tuple: absolute path, modification time in ns and size of the file
+    """
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+@functools.lru_cache(maxsize=32)
+def _load_csv(path: str, mtime: int, size: int, modid_column: int) -> array.array:
+    """Reads the mod ids from a .csv file.
+    Results are cached as unboxed C ints, mtime and size invalidate
+    the cache when the file changes.
+
+    Args:
+        path (str): absolute path to the .csv file
+        mtime (int): modification time of the file in ns
+        size (int): size of the file in bytes
+        modid_column (int): column number of the mod ids
+
+    Returns:
+        array.array: mod ids from the column, without the header
+    """
+    with open(path, newline="") as csvfile:
+        # Recognizes the delimiter from the first line, mod lists with
+        # a single column fall back to the default dialect
+        first_line = csvfile.readline()
+        if not first_line:
+            return array.array("i")
+        try:
+            dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+
+        # The first row is a header, unless it already holds a mod id
+        first_row = next(csv.reader([first_line], dialect=dialect))
+        modid_array = array.array("i")
+        try:
+            modid_array.append(int(first_row[modid_column]))
+        except ValueError:
+            pass
+
+        # Reads the rest of the modids and adds to modid_array
+        if _HAS_PANDAS and size >= _PANDAS_CSV_MIN_SIZE:
+            modid_array.extend(_read_csv_column_pandas(csvfile, dialect, modid_column))
+        else:
+            get_modid = operator.itemgetter(modid_column)
+            modid_array.extend(map(int, map(get_modid, csv.reader(csvfile, dialect=dialect))))
+
+    return modid_array
+
+
+def _read_csv_column_pandas(csvfile, dialect, modid_column: int) -> list:
+    """Reads the mod ids from the rest of an opened .csv file with pandas.
+
+    Args:
+        csvfile: .csv file opened in text mode, positioned after the header
+        dialect: csv dialect of the file
+        modid_column (int): column number of the mod ids
+
+    Returns:
+        list: mod ids from the column
+    """
+    import pandas
+
+    try:
+        frame = pandas.read_csv(csvfile,
+                                sep=dialect.delimiter,
+                                quotechar=dialect.quotechar,
+                                header=None,
+                                usecols=[modid_column],
+                                dtype={modid_column: "int64"},
+                                engine="c")
+    except pandas.errors.EmptyDataError:
+        return []
+    return frame.iloc[:, 0].tolist()
+
+
+@functools.lru_cache(maxsize=32)
+def _load_excel(path: str, mtime: int, size: int, modid_column: int) -> array.array:
+    """Reads the mod ids from a spreadsheet.
+    Results are cached as unboxed C ints, mtime and size invalidate
+    the cache when the file changes.
+
+    Args:
+        path (str): absolute path to the spreadsheet
+        mtime (int): modification time of the file in ns
+        size (int): size of the file in bytes
+        modid_column (int): column number of the mod ids
+
+    Returns:
+        array.array: mod ids from the column, without the header
+    """
+    if _HAS_PANDAS:
+        return array.array("i", _read_excel_column_pandas(path, modid_column))
+    if _HAS_CALAMINE:
+        return array.array("i", _read_excel_column_calamine(path, modid_column))
+    return array.array("i", _read_excel_column_openpyxl(path, modid_column))
+
+
+def _read_excel_column_pandas(file_name: str, modid_column: int) -> list:
+    """Reads the mod ids from the first sheet of a spreadsheet with pandas.
+    Only the mod id column is parsed, with calamine as the engine if installed
+    and supported by pandas (2.2 and later), openpyxl otherwise.
+
+    Args:
+        file_name (str): name of the spreadsheet file
+        modid_column (int): column number of the mod ids
+
+    Returns:
+        list: mod ids from the column, without the header
+    """
+    import pandas
+
+    pandas_version = tuple(int(part) for part in pandas.__version__.split(".")[:2])
+    engine = "calamine" if _HAS_CALAMINE and pandas_version >= (2, 2) else "openpyxl"
+    frame = pandas.read_excel(file_name,
+                              sheet_name=0,
+                              usecols=[modid_column],
+                              engine=engine)
+    return frame.iloc[:, 0].dropna().astype("int64").tolist()
+
+
+def _read_excel_column_calamine(file_name: str, modid_column: int) -> list:
+    """Reads the mod ids from the first sheet of a spreadsheet with python-calamine.
+
+    Args:
+        file_name (str): name of the spreadsheet file
+        modid_column (int): column number of the mod ids
+
+    Returns:
+        list: mod ids from the column, without the header
+    """
+    import python_calamine
+
+    book = python_calamine.CalamineWorkbook.from_path(file_name)
+    rows = book.get_sheet_by_index(0).to_python(skip_empty_area=False)
+
+    return [int(row[modid_column]) for row in rows[1:]
+            if row[modid_column] not in (None, "")]
+
+
+def _read_excel_column_openpyxl(file_name: str, modid_column: int) -> list:
+    """Reads the mod ids from the first sheet of an .xlsx file with openpyxl.
+    The first sheet is read like by the other readers, calamine cannot tell
+    which sheet is active.
+
+    Args:
+        file_name (str): name of the .xlsx file
+        modid_column (int): column number of the mod ids
+
+    Returns:
+        list: mod ids from the column, without the header
+    """
+    import openpyxl
+
+    book = openpyxl.load_workbook(filename=file_name,
+                                  read_only=True,
+                                  data_only=True)
+    try:
+        sheet = book.worksheets[0]
+
+        # Read in only the modid column, skipping the header row
+        rows = sheet.iter_rows(min_col=modid_column + 1,
+                               max_col=modid_column + 1,
+                               values_only=True)
+        next(rows, None)
+        return [int(value) for (value,) in rows if value is not None]
+    finally:
+        book.close()
@@ -23,6 +23,7 @@
 # SOFTWARE.
 
 
+import types
 import webbrowser
 from typing import Union, List, Optional
 
@@ -34,11 +35,18 @@ class NexusBrowser:
         file_ids:
         domain_name:
         links:
-        _games_dict:
+        _game_id: Nexus Mods game id of domain_name
+        _games_dict: read-only mapping of domain names to game ids, shared by all instances
 
     Examples:
 
     """
+    _games_dict = types.MappingProxyType({
+        "morrowind": 100,
+        "skyrim": 110,
+        "oblivion": 101,
+    })
+
     def __init__(self,
                  file_ids: Union[int, List[int]] = None,
                  domain_name: str = None,
@@ -48,15 +56,33 @@ class NexusBrowser:
         else:
             self.file_ids = file_ids
         self.domain_name = domain_name
+        self._game_id = None
+        if domain_name is not None:
+            self._game_id = self._get_game_id(domain_name)
         if links is not None and isinstance(links, str):
             links = [links]
         else:
             self.links = links
-        self._games_dict = {
-            "morrowind": 100,
-            "skyrim": 110,
-            "oblivion": 101,
-        }
+
+    @classmethod
+    def _get_game_id(cls, domain_name: str) -> int:
+        """Looks up the Nexus Mods game id of a domain name.
+
+        Args:
+            domain_name: domain name of the game in Nexus Mods
+
+        Returns:
+            game id
+
+        Raises:
+            ValueError: if the domain name is not a known game
+        """
+        try:
+            return cls._games_dict[domain_name]
+        except KeyError:
+            raise ValueError("{} is not a valid game name. "
+                             "Available are: {}".format(domain_name,
+                                                        list(cls._games_dict))) from None
 
     def _generate_downloadpage_links_from_file_ids(
             self,
@@ -72,21 +98,22 @@ class NexusBrowser:
         Returns:
             List of links
 
+        Raises:
+            ValueError: if the domain name is missing or not a known game
+
         Examples:
 
         """
-        try:
-            game_id = self._games_dict[self.domain_name]
-        except KeyError as error:
-            print("{} is not a valid game name."
-                  "Error message: {}".format(domain_name, error))
-
-        links = [("https://www.nexusmods.com/Core/Libs/Common/"
-                  "Widgets/DownloadPopUp?id={file_id}&game_id={game_id}"
-                  "&source=FileExpander").format(file_id=file_id,
-                                                 game_id=game_id)
-                 for file_id
-                 in file_ids]
+        # A missing domain name is rejected by _get_game_id
+        if domain_name is not None and domain_name == self.domain_name:
+            game_id = self._game_id
+        else:
+            game_id = self._get_game_id(domain_name)
+
+        # Only the file id changes between the links
+        prefix = "https://www.nexusmods.com/Core/Libs/Common/Widgets/DownloadPopUp?id="
+        suffix = "&game_id={}&source=FileExpander".format(game_id)
+        links = [prefix + str(file_id) + suffix for file_id in file_ids]
 
         return links
 
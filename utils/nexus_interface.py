@@ -23,15 +23,36 @@
 # SOFTWARE.
 
 
+import functools
 import json
 import os
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 import utils.authorization as authorization
 import utils.nexus_queries as nexus_queries
 import utils.mod_import as mod_import
 
+# Headers, which are the same for every request to Nexus API
+_API_HEADERS = types.MappingProxyType({
+    "accept": "application/json",
+    # Only the encodings urllib3 can decode, "br" once brotli is installed
+    "accept-encoding": ACCEPT_ENCODING,
+    "connection": "keep-alive"
+})
+
+# Responses of the successful validations by API key, shared by all the interfaces
+_VALIDATIONS = {}
+
 
 class NexusInterface:
     """Interacts with NexusMods.
@@ -39,69 +60,106 @@ class NexusInterface:
 
     Attributes:
         authenticator: an instance of Authenticator class with a loaded API key
+        cache_ttl: seconds the mod infos and file lists are cached on disk
+        _profile_dir: folder with the user profile, mod infos and file lists
+        _user_profile_path: path to the user profile json
+        _mod_infos_path: path to the mod infos json
+        _file_lists_path: path to the file lists json
+        _cache_dir: folder with the cached mod infos and file lists
+        _headers: headers sent with every request to Nexus API
+        _session: requests.Session keeping the connections to Nexus API alive
+        _query: ModFileQuery sending all the requests of the interface
 
     Examples:
 
     """
 
     def __init__(self,
-                 authenticator: authorization.Authenticator = None):
+                 authenticator: authorization.Authenticator = None,
+                 cache_ttl: float = 3600):
         self.authenticator = authenticator
+        self.cache_ttl = cache_ttl
+        # The output paths are the same for every call, the folder is created once
+        self._profile_dir = os.path.normpath("profile")
+        self._user_profile_path = os.path.join(self._profile_dir, "user_profile.json")
+        self._mod_infos_path = os.path.join(self._profile_dir, "mod_infos.json")
+        self._file_lists_path = os.path.join(self._profile_dir, "file_lists.json")
+        self._cache_dir = os.path.join(self._profile_dir, ".cache")
+        os.makedirs(self._profile_dir, exist_ok=True)
+        self._cached_headers = None
+        self._session = nexus_queries.create_session()
+        # Every request goes through this query, only the endpoint and
+        # the arguments change between them
+        self._query = nexus_queries.ModFileQuery(session=self._session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the connections to Nexus API."""
+        self._session.close()
+
+    @property
+    def _headers(self) -> dict:
+        """Headers sent with every request, built once per API key."""
+        api_key = self.authenticator.api_key
+        if self._cached_headers is None or self._cached_headers["apikey"] != api_key:
+            self._cached_headers = {**_API_HEADERS, "apikey": api_key}
+        return self._cached_headers
 
     def authenticate(self) -> requests.Response:
         """Function, which sends a validation request to the API.
         It check whether the key is valid and also update the information
         about the user (premium or not, saves api_key, etc.
+        A successful validation is remembered for the whole process, so
+        the next calls with the same key, from any NexusInterface, return
+        the same response without a request.
 
         Returns:
             requests.Response with the response from the API
         """
-        # Setting the required headers
-        headers = {
-            "apikey": self.authenticator.api_key,
-            "accept": "application/json"
-        }
+        # A key, which was already validated, is not sent to Nexus again
+        api_key = self.authenticator.api_key
+        cached = _VALIDATIONS.get(api_key)
+        if cached is not None:
+            return cached
 
         # Getting the response from Nexus
-        query = nexus_queries.NexusQuery(query_type=requests.get,
-                                         headers=headers)
-        response = query.query("users/validate.json", headers=headers)
-
         # Checking whether HTTP error occurred
-        # Checking whether the response is a response containing the information
         try:
-            response.raise_for_status()
+            response = _validate(self._query, self._headers)
         except requests.HTTPError as error:
             print("Http error occurred: {}. Connection issues"
                   " or wrong api key.".format(error))
             return requests.Response()
 
-        if response.status_code != 200:
-            print("Error occurred during authentication.")
-            return requests.Response()
-
         # Saving the body of the response to a profile file
         # Body should contain the information about the user
-        decoded = response.json()
-        file_name = os.path.normpath("profile/user_profile.json")
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        with open(file_name, mode="wt", encoding="utf-8") as write_file:
-            json.dump(obj=decoded, fp=write_file)
+        decoded = _loads(response.content)
+        _write_json(self._user_profile_path, decoded)
+        _VALIDATIONS[api_key] = response
 
         return response
 
     def import_mod_info(self,
                         importer: mod_import.ModListImporter(),
-                        game_domain: str) -> dict:
+                        game_domain: str,
+                        max_workers: int = 16) -> dict:
         """Attempts to download info about mods listed in mod_id.
         Attempts to get the info about mods via HTTP GET request to
         Nexus API. Also outputs the info about mods to a file
-        in profile/mod_info.json.
+        in profile/mod_info.json. Infos fetched less than cache_ttl
+        seconds ago are read from the disk cache instead, older ones
+        are revalidated with their ETags.
 
         Args:
             importer:
             game_domain:
             mod_id:
+            max_workers: maximum number of requests sent at the same time
 
         Returns:
             dict
@@ -111,47 +169,61 @@ class NexusInterface:
         # Creating a list from mod_id
         mod_id = importer.mod_list
 
-        # Setting the required headers
-        headers = {
-            "apikey": self.authenticator.api_key,
-            "accept": "application/json"
-        }
+        headers = self._headers
 
         # Asserting things are what they should be
         assert isinstance(game_domain, str), "{} is not an instance of str.".format(game_domain)
         assert isinstance(mod_id, (int, list)), "{} is not a list.".format(mod_id)
 
-        # Importing mod info
-        import_query = nexus_queries.ModFileQuery(game_domain=game_domain,
-                                                  headers=headers)
-        response_list = import_query.generate_mod_info(headers=headers,
-                                                       mod_id=mod_id)
+        # Reading the mod infos cached by the previous imports
+        mod_info_dict = {}
+        missing_ids = []
+        for single_id in mod_id:
+            cached = self._read_cache("mods", game_domain, single_id)
+            if cached is None:
+                missing_ids.append(single_id)
+            else:
+                mod_info_dict[single_id] = cached
+
+        # Importing mod info, the stale cached infos are revalidated with their ETags
+        stale = [self._read_stale_cache("mods", game_domain, single_id)
+                 for single_id in missing_ids]
+        response_list = self._query.generate_mod_info(
+            mod_id=missing_ids,
+            game_domain=game_domain,
+            headers=headers,
+            max_workers=max_workers,
+            mod_headers=[_revalidation_headers(headers, etag) for _, etag in stale])
 
         # Decoding json and creating a dict of mod infos
-        mod_info_dict = {}
-        for response in response_list:
-            decoded = response.json()
-            mod_info_dict[decoded["mod_id"]] = decoded
+        for single_id, (cached, etag), response in zip(missing_ids, stale, response_list):
+            decoded = self._decode_response("mods", game_domain, single_id,
+                                            response, cached, etag)
+            # Skipping the mods, which could not be requested
+            if decoded is not None:
+                mod_info_dict[single_id] = decoded
 
         # Saving infos of all the mods as a .json file
         # Inside profile/mod_infos.json
-        path = os.path.normpath("profile/mod_infos.json")
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "wt", encoding="utf-8") as output_file:
-            json.dump(obj=mod_info_dict, fp=output_file)
+        _write_json(self._mod_infos_path, mod_info_dict)
 
         return mod_info_dict
 
     def import_file_list(self,
                          importer: mod_import.ModListImporter,
-                         domain_name: str) -> dict:
+                         domain_name: str,
+                         max_workers: int = 16) -> dict:
         """Attempts to import file lists for a list of mods.
         Attempts to import file lists for a list of mods specified
-        by their mod ids via HTTP GET requests to Nexus API.
+        by their mod ids via concurrent HTTP GET requests to Nexus API.
+        File lists fetched less than cache_ttl seconds ago are read
+        from the disk cache instead, older ones are revalidated with
+        their ETags.
 
         Args:
             importer: contains the mod ids
             domain_name: name of the game as described by Nexus Mods
+            max_workers: maximum number of requests sent at the same time
 
         Returns:
             dict
@@ -161,28 +233,269 @@ class NexusInterface:
         """
         mod_ids = importer.mod_list
 
-        # Create the header
-        header = {
-            "apikey": self.authenticator.api_key,
-            "accept": "application/json"
-        }
+        header = self._headers
 
-        # Download the file lists via HTTP GET
-        file_list_dict = {}
+        # Read the file lists cached by the previous imports
         assert isinstance(domain_name, str), "{} is not a str object.".format(domain_name)
-        mod_file_query = nexus_queries.ModFileQuery(game_domain=domain_name,
-                                                    headers=header)
+        file_list_dict = {}
+        missing_ids = []
         for single_id in mod_ids:
-            # Make the request
-            response = mod_file_query.list_files(mod_id=single_id).json()
-
-            file_list_dict[single_id] = response
+            cached = self._read_cache("files", domain_name, single_id)
+            if cached is None:
+                missing_ids.append(single_id)
+            else:
+                file_list_dict[single_id] = cached
+
+        # Download the rest of the file lists via HTTP GET
+        # The stale cached file lists are revalidated with their ETags
+        stale = [self._read_stale_cache("files", domain_name, single_id)
+                 for single_id in missing_ids]
+        list_files = functools.partial(self._query.list_files, game_domain=domain_name)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Make the requests
+            responses = executor.map(
+                lambda single_id, etag: list_files(mod_id=single_id,
+                                                   headers=_revalidation_headers(header, etag)),
+                missing_ids,
+                [etag for _, etag in stale])
+
+            for single_id, (cached, etag), response in zip(missing_ids, stale, responses):
+                decoded = self._decode_response("files", domain_name, single_id,
+                                                response, cached, etag)
+                # Skipping the mods, which could not be requested
+                if decoded is not None:
+                    file_list_dict[single_id] = decoded
 
         # Output to a file
         # profile/file_lists.json
-        path = os.path.normpath("profile/file_lists.json")
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "wt", encoding="utf-8") as output_file:
-            json.dump(obj=file_list_dict, fp=output_file)
+        _write_json(self._file_lists_path, file_list_dict)
 
         return file_list_dict
+
+    def import_updated_mod_ids(self,
+                               importer: mod_import.ModListImporter,
+                               game_domain: str,
+                               period: str = "1w") -> list:
+        """Finds the mods from a list, which were updated within a period.
+        Asks Nexus API for all the recently updated mods of the game in one
+        request, instead of requesting the info about every mod.
+
+        Args:
+            importer: contains the mod ids
+            game_domain: name of the game as described by Nexus Mods
+            period: one of "1d", "1w" or "1m"
+
+        Returns:
+            list of the updated mod ids, in the order of importer.mod_list
+        """
+        headers = self._headers
+
+        assert isinstance(game_domain, str), "{} is not a str object.".format(game_domain)
+        response = self._query.list_updated(period=period,
+                                            game_domain=game_domain,
+                                            headers=headers)
+
+        updated = {entry["mod_id"] for entry in _loads(response.content)}
+        return [mod_id for mod_id in importer.mod_list if mod_id in updated]
+
+    def _cache_path(self, kind: str, game_domain: str, mod_id: int) -> str:
+        """Creates the path to a cached response about a mod.
+
+        Args:
+            kind: "mods" for mod infos or "files" for file lists
+            game_domain: name of the game as described by Nexus Mods
+            mod_id: Nexus Mods mod id
+
+        Returns:
+            str path to the cache file
+        """
+        return os.path.join(self._cache_dir, game_domain, kind, "{}.json".format(mod_id))
+
+    def _read_cache(self, kind: str, game_domain: str, mod_id: int, ttl: float = None):
+        """Reads a cached response about a mod, if it is younger than ttl.
+
+        Args:
+            kind: "mods" for mod infos or "files" for file lists
+            game_domain: name of the game as described by Nexus Mods
+            mod_id: Nexus Mods mod id
+            ttl: maximum age of the cached response in seconds, defaults to cache_ttl
+
+        Returns:
+            decoded json of the response or None, if it is not cached
+        """
+        if ttl is None:
+            ttl = self.cache_ttl
+        path = self._cache_path(kind, game_domain, mod_id)
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                return None
+            with open(path, "rb") as cache_file:
+                return _loads(cache_file.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, kind: str, game_domain: str, mod_id: int, decoded,
+                     etag: str = None):
+        """Caches a response about a mod on the disk.
+        The ETag of the response is kept next to it in a .etag file.
+
+        Args:
+            kind: "mods" for mod infos or "files" for file lists
+            game_domain: name of the game as described by Nexus Mods
+            mod_id: Nexus Mods mod id
+            decoded: decoded json of the response
+            etag: ETag header of the response
+        """
+        path = self._cache_path(kind, game_domain, mod_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_json(path, decoded)
+        etag_path = path + ".etag"
+        if etag is None:
+            # An ETag of an older response would not match this one
+            if os.path.exists(etag_path):
+                os.remove(etag_path)
+        else:
+            with open(etag_path, "w", encoding="utf-8") as etag_file:
+                etag_file.write(etag)
+
+    def _read_stale_cache(self, kind: str, game_domain: str, mod_id: int) -> tuple:
+        """Reads a cached response about a mod of any age together with its ETag.
+        An ETag without a readable response is removed, it must not be sent
+        to Nexus API, which would answer 304 Not Modified without a body.
+
+        Args:
+            kind: "mods" for mod infos or "files" for file lists
+            game_domain: name of the game as described by Nexus Mods
+            mod_id: Nexus Mods mod id
+
+        Returns:
+            tuple of the decoded json of the response and its ETag,
+            (None, None) if either of them is missing
+        """
+        etag_path = self._cache_path(kind, game_domain, mod_id) + ".etag"
+        try:
+            with open(etag_path, encoding="utf-8") as etag_file:
+                etag = etag_file.read()
+        except OSError:
+            return None, None
+
+        decoded = self._read_cache(kind, game_domain, mod_id, ttl=float("inf"))
+        if decoded is None:
+            try:
+                os.remove(etag_path)
+            except OSError:
+                pass
+            return None, None
+        return decoded, etag
+
+    def _decode_response(self, kind: str, game_domain: str, mod_id: int,
+                         response: requests.Response, cached, etag: str):
+        """Decodes a response about a mod and updates the disk cache with it.
+        If Nexus API answered 304 Not Modified to a revalidation, the cached
+        response is used and considered fresh for another cache_ttl seconds.
+        If the request failed without a response, the stale cached response
+        is used as it is.
+
+        Args:
+            kind: "mods" for mod infos or "files" for file lists
+            game_domain: name of the game as described by Nexus Mods
+            mod_id: Nexus Mods mod id
+            response: response of Nexus API
+            cached: decoded json of the stale cached response or None
+            etag: ETag of the stale cached response or None
+
+        Returns:
+            decoded json of the response or None, if the request failed
+            and nothing is cached
+        """
+        # NexusQuery.query answers failed requests with an empty response
+        if response.status_code is None:
+            return cached
+
+        if response.status_code == 304:
+            # Rewriting the entry restarts its age, even if it was removed meanwhile
+            self._write_cache(kind, game_domain, mod_id, cached, etag)
+            return cached
+
+        decoded = _loads(response.content)
+        if response.status_code == 200:
+            self._write_cache(kind, game_domain, mod_id, decoded,
+                              response.headers.get("ETag"))
+        return decoded
+
+
+def _loads(data: bytes):
+    """Decodes json straight from bytes, with orjson if it is installed.
+
+    Args:
+        data: utf-8 encoded json
+
+    Returns:
+        decoded object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(obj) -> bytes:
+    """Encodes an object as utf-8 json bytes, with orjson if it is installed.
+    Integer keys (mod ids) are written as strings, like json.dumps does.
+
+    Args:
+        obj: json serializable object
+
+    Returns:
+        bytes with the encoded json
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _write_json(path: str, obj):
+    """Writes an object as json into a file.
+    The encoded object goes to the disk through a 1 MiB buffer in a single write.
+
+    Args:
+        path: path to the written file
+        obj: json serializable object
+    """
+    with open(path, "wb", buffering=1 << 20) as output_file:
+        output_file.write(_dumps(obj))
+
+
+def _revalidation_headers(headers: dict, etag: str) -> dict:
+    """Adds If-None-Match with the ETag of a cached response to headers.
+
+    Args:
+        headers: headers of the request
+        etag: ETag of the cached response or None
+
+    Returns:
+        dict of headers, the same headers if there is no ETag
+    """
+    if etag is None:
+        return headers
+    return {**headers, "if-none-match": etag}
+
+
+def _validate(query: nexus_queries.NexusQuery, headers: dict) -> requests.Response:
+    """Sends a validation request for an API key to the API.
+    Failed validations raise requests.HTTPError.
+
+    Args:
+        query: NexusQuery sending the request
+        headers: headers with the Nexus Mods API key
+
+    Returns:
+        requests.Response with the response from the API
+    """
+    response = query.query("users/validate.json", headers=headers)
+
+    # Checking whether the response is a response containing the information
+    if response.status_code != 200:
+        raise requests.HTTPError("Validation failed with status code "
+                                 "{}".format(response.status_code),
+                                 response=response)
+    return response
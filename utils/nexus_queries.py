@@ -24,8 +24,137 @@
 
 """Module containing the tools for downloading mods from Nexus Mods."""
 
+import email.utils
+import functools
+import logging
+import random
+import re
+import threading
+import time
 import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+_log = logging.getLogger(__name__)
+
+# Log messages of the failed requests, looked up along the exception's MRO
+_ERROR_MESSAGES = {
+    requests.exceptions.Timeout: "Request to Nexus API timed out: %s.",
+    requests.exceptions.ConnectionError: "Could not connect to Nexus API: %s.",
+    requests.exceptions.TooManyRedirects: "Too many redirects from Nexus API: %s.",
+    requests.exceptions.HTTPError: "HTTP error from Nexus API: %s.",
+    requests.exceptions.URLRequired: "No valid url for Nexus API: %s.",
+    requests.exceptions.RequestException: "Request to Nexus API failed: %s."
+}
+
+
+class _ResponseCache:
+    """Keeps successful GET responses from Nexus API for a short time.
+    Honors Cache-Control and Expires headers of the responses.
+
+    Attributes:
+        maxsize (int): maximum number of the kept responses
+        ttl (float): seconds a response is kept, if the response does not say otherwise
+    """
+    def __init__(self, maxsize: int = 512, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> typing.Optional[requests.Response]:
+        """Returns the kept response for the key, if it is still fresh."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, response = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return response
+
+    def put(self, key: tuple, response: requests.Response):
+        """Keeps the response for the key, unless it must not be cached."""
+        ttl = self._freshness(response)
+        if ttl <= 0:
+            return
+        with self._lock:
+            # Dropping the oldest response
+            if len(self._entries) >= self.maxsize:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + ttl, response)
+
+    def _freshness(self, response: requests.Response) -> float:
+        """Calculates how many seconds the response can be kept."""
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return 0
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        if max_age:
+            return int(max_age.group(1))
+        expires = response.headers.get("Expires")
+        if expires is not None:
+            try:
+                return email.utils.parsedate_to_datetime(expires).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return 0
+        return self.ttl
+
+
+_RESPONSE_CACHE = _ResponseCache()
+
+
+class _JitteredRetry(Retry):
+    """Retry with an exponential backoff, which is randomized and capped.
+    The jitter keeps the concurrent queries from retrying in lockstep.
+    Retry-After headers sent with 429 and 503 responses take precedence.
+    """
+    JITTER = 0.5
+    MAX_BACKOFF = 30
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return min(backoff * (1 + random.random() * self.JITTER), self.MAX_BACKOFF)
+
+
+def create_session(pool_connections: int = 4,
+                   pool_maxsize: int = 32) -> requests.Session:
+    """Creates a requests.Session for Nexus API.
+    The session keeps the connections to the API alive and retries
+    failed connections and 429/5xx responses with a backoff. Responses
+    are requested compressed with every encoding urllib3 can decode.
+
+    Args:
+        pool_connections: number of hosts the session keeps connections to
+        pool_maxsize: maximum number of connections kept alive per host,
+            sized above the 16 workers of the concurrent queries. When all of
+            them are busy, new connections are opened instead of blocking
+
+    Returns:
+        requests.Session
+    """
+    retry = _JitteredRetry(total=3,
+                           backoff_factor=1.0,
+                           status_forcelist=[429, 500, 502, 503, 504],
+                           respect_retry_after_header=True,
+                           raise_on_status=False)
+    session = requests.Session()
+    session.headers.update({"Accept-Encoding": ACCEPT_ENCODING})
+    session.mount("https://", HTTPAdapter(pool_connections=pool_connections,
+                                          pool_maxsize=pool_maxsize,
+                                          pool_block=False,
+                                          max_retries=retry))
+    return session
+
+
+# Shared by all the queries, which do not get a session of their own
+_SESSION = create_session()
 
 
 class NexusQuery:
@@ -34,10 +163,18 @@ class NexusQuery:
     Mods site.
 
     Attributes:
-        url (optional): string of a url to request. Must be a complete address
-        query_type (optional): a request function, like requests.get or requests.post
+        url (optional): string of a url to request. Either a complete address
+            or an endpoint relative to _base_url
+        method (optional): HTTP method of the request, like "get" or "post"
         params (optional): a dict of parameters:values passed to request
         headers (optional): a dict of headers:values passed to request
+        session (optional): requests.Session sending the requests, reusing its
+            connections between queries. Defaults to a session shared by all queries.
+        connect_timeout (optional): seconds to wait for a connection to the API,
+            defaults to 3.05
+        read_timeout (optional): seconds to wait for the API between bytes of
+            the response, defaults to 15. The timeouts only bound hung sockets,
+            slow responses are handled by the retries of the session
         _base_url (str): defines the base of the base URL of the API,
             defaults to "https://api.nexusmods.com/v1/".
 
@@ -50,27 +187,36 @@ class NexusQuery:
 
     def __init__(self,
                  url: str = None,
-                 query_type: typing.Union[requests.get,
-                                          requests.post] = None,
+                 method: str = "get",
                  params: dict = None,
-                 headers: dict = None):
+                 headers: dict = None,
+                 session: requests.Session = None,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 15):
         self.url = url
-        self.query_type = query_type
+        self.method = method
         self.params = params
         self.headers = headers
+        self.timeout = (connect_timeout, read_timeout)
+        self._session = session or _SESSION
         self._base_url = "https://api.nexusmods.com/v1/"
 
     def query(self,
               url: str = None,
               params: dict = None,
-              headers: dict = None) -> requests.Response:
+              headers: dict = None,
+              stream: bool = False) -> requests.Response:
         """Sends requests to Nexus API.
         Args:
-            url (str, optional): a full url sent to Nexus API via requests functions
+            url (str, optional): an endpoint relative to _base_url, like
+                "users/validate.json", or a complete url. Defaults to self.url
             params(dict, optional): parameters to requests, default is declared during
                 the initialization of the class
             headers(dict, optional): headers to requests, default is declared during
                 the initialization of the class
+            stream(bool, optional): if True, the response is returned as soon as
+                its headers arrive and its body is not downloaded. Streamed responses
+                are not cached and must be closed by the caller
 
         Returns:
             requests.Response object
@@ -83,56 +229,99 @@ class NexusQuery:
             params = self.params
         if headers is None:
             headers = self.headers
-        if url is None:
-            url = self.url
-        else:
-            url = self._base_url + url
+        # Relative endpoints are resolved against the API, complete urls are kept
+        url = urljoin(self._base_url, self.url if url is None else url)
 
         # Make sure headers include the API key and accept json
-        assert "apikey" in headers.keys(), "API key is not provided in headers {}." \
-                                           "Make sure headers include 'apikey'.".format(headers)
-        assert "accept" in headers.keys(), "accept not included in headers {}." \
-                                           "Make sure headers include 'accept'.".format(headers)
+        assert "apikey" in headers, "API key is not provided in headers {}." \
+                                    "Make sure headers include 'apikey'.".format(headers)
+        assert "accept" in headers, "accept not included in headers {}." \
+                                    "Make sure headers include 'accept'.".format(headers)
+
+        # Answering repeated GET queries from the cache
+        cache_key = None
+        if self.method.lower() == "get" and not stream:
+            cache_key = (url, frozenset((params or {}).items()), headers["apikey"])
+            cached = _RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
 
         try:
-            with self.query_type(url,
-                                 params=params,
-                                 headers=headers,
-                                 timeout=5) as response:
+            response = self._session.request(self.method,
+                                             url,
+                                             params=params,
+                                             headers=headers,
+                                             timeout=self.timeout,
+                                             stream=stream)
+            if stream:
                 return response
-        except requests.exceptions.ConnectionError as error:
-            print("Connection error occurred: {}.".format(error))
-            return requests.Response()
-        except requests.exceptions.Timeout as error:
-            print("Connection timed out: {}.".format(error))
-            return requests.Response()
-        except requests.exceptions.TooManyRedirects as error:
-            print("Too many redirects: {}".format(error))
-            return requests.Response()
-        except requests.exceptions.HTTPError as error:
-            print("An HTTP error occurred: {}.".format(error))
-            return requests.Response()
-        except requests.exceptions.URLRequired as error:
-            print("Please specify the URL: {}.".format(error))
+            with response:
+                if cache_key is not None and response.status_code == 200:
+                    _RESPONSE_CACHE.put(cache_key, response)
+                return response
+        except requests.exceptions.RequestException as error:
+            message = next(_ERROR_MESSAGES[cls] for cls in type(error).__mro__
+                           if cls in _ERROR_MESSAGES)
+            _log.warning(message, error)
             return requests.Response()
 
+    def query_many(self,
+                   urls: typing.Iterable[str],
+                   params: dict = None,
+                   headers: dict = None,
+                   max_workers: int = 8,
+                   url_headers: typing.Iterable[dict] = None) -> typing.List[requests.Response]:
+        """Sends several requests to Nexus API concurrently.
+        The requests wait for the network at the same time, so a batch takes
+        about as long as its slowest request instead of the sum of all of them.
+
+        Args:
+            urls: urls relative to Nexus API, like in query
+            params(dict, optional): parameters to requests, default is declared during
+                the initialization of the class
+            headers(dict, optional): headers to requests, default is declared during
+                the initialization of the class
+            max_workers: maximum number of requests sent at the same time
+            url_headers(optional): headers of every url, in the order of urls.
+                Replace headers for the requests, which need headers of their own
+
+        Returns:
+            list of requests.Response objects in the order of urls
+        """
+        query = functools.partial(self.query, params=params)
+        urls = list(urls)
+        if url_headers is None:
+            url_headers = [headers] * len(urls)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda url, url_header: query(url, headers=url_header),
+                                     urls,
+                                     url_headers))
+
 
 class ModFileQuery(NexusQuery):
     """Generates requests about mod files to Nexus API.
     Inherits from ``NexusQuery``.
 
     Attributes:
-        url (optional): string of a url to request. Must be a complete address
+        url (optional): string of a url to request. Either a complete address
+            or an endpoint relative to _base_url
         game_domain (optional): specifies the game, which is modded by the requested mod
         mod_id (optional): specifies the mod id as set by Nexus Mods
         file_id (optional): specifies the file id
-        query_type (optional): a request function, like requests.get or requests.post
+        method (optional): HTTP method of the request, like "get" or "post"
         params (dict): a dict of parameters:values passed to request
         headers (dict) a dict of headers:values passed to request
+        session (optional): requests.Session sending the requests
+        connect_timeout (optional): seconds to wait for a connection to the API,
+            defaults to 3.05
+        read_timeout (optional): seconds to wait for the API between bytes of
+            the response, defaults to 15
 
     Methods:
         list_files: lists files for a specified mod
         generate_link: generates a download link using the Nexus API
+        generate_mod_info: gets information about specified mods
+        list_updated: lists mods of a game updated within a period
 
     Returns:
         request.Response object
@@ -145,10 +334,14 @@ class ModFileQuery(NexusQuery):
                  game_domain: str = None,
                  mod_id: int = None,
                  file_id: int = None,
-                 query_type=requests.get,
+                 method: str = "get",
                  params: dict = None,
-                 headers: dict = None):
-        super(ModFileQuery, self).__init__(url, query_type, params, headers)
+                 headers: dict = None,
+                 session: requests.Session = None,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 15):
+        super().__init__(url, method, params, headers, session,
+                         connect_timeout, read_timeout)
         self.game_domain = game_domain
         self.mod_id = mod_id
         self.file_id = file_id
@@ -184,14 +377,15 @@ class ModFileQuery(NexusQuery):
             headers = self.headers
 
         # Creating a URL request
-        self.url = ("games/{domain}/mods/{mod_id}/files.json".format(domain=game_domain,
-                                                                     mod_id=mod_id))
+        # Kept local, so list_files can be called from several threads
+        url = f"games/{game_domain}/mods/{mod_id}/files.json"
 
-        print(self.url, params, headers)
+        # The headers are left out, they contain the API key
+        _log.debug("Listing files: %s %s", url, params)
         # Executing the query
-        response: requests.Response = super(ModFileQuery, self).query(self.url,
-                                                                      params=params,
-                                                                      headers=headers)
+        response: requests.Response = self.query(url,
+                                                 params=params,
+                                                 headers=headers)
 
         return response
 
@@ -226,34 +420,110 @@ class ModFileQuery(NexusQuery):
             headers = self.headers
 
         # Creating a URL request
-        self.url = ("games/{domain}/mods/{mod_id}/files/{file_id}/"
-                    "download_link.json".format(domain=game_domain,
-                                                mod_id=mod_id,
-                                                file_id=file_id))
+        # Kept local, so generate_link can be called from several threads
+        url = f"games/{game_domain}/mods/{mod_id}/files/{file_id}/download_link.json"
 
         # Executing the query
-        response: requests.Response = super(ModFileQuery, self).query(self.url,
-                                                                      params=params,
-                                                                      headers=headers)
+        response: requests.Response = self.query(url,
+                                                 params=params,
+                                                 headers=headers)
         assert isinstance(response, requests.Response), "response is not a " \
                                                         "requests.Response object."
 
         return response
 
+    def generate_links(self,
+                       pairs: typing.Iterable[typing.Tuple[int, int]],
+                       game_domain: str = None,
+                       params: dict = None,
+                       headers: dict = None,
+                       max_workers: int = 16) -> typing.Iterator[
+                           typing.Tuple[typing.Tuple[int, int], requests.Response]]:
+        """Requests download links for several files concurrently.
+        The responses are yielded as soon as each of them arrives, so the caller
+        can start downloading a file while the other links are still requested.
+        See generate_download_urls for the urls of the files themselves.
+
+        Args:
+            pairs: iterable of (mod_id, file_id) tuples
+            game_domain: a domain of the game the mods are modifying. Example: "skyrim"
+            params: dictionary of parameters:values to pass to requests
+            headers: dictionary of headers:values to pass to requests
+            max_workers: maximum number of requests sent at the same time
+
+        Yields:
+            tuple of (mod_id, file_id) and the requests.Response with its links
+        """
+        if game_domain is None:
+            game_domain = self.game_domain
+        if params is None:
+            params = self.params
+        if headers is None:
+            headers = self.headers
+
+        prefix = f"games/{game_domain}/mods/"
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.query,
+                                f"{prefix}{mod_id}/files/{file_id}/download_link.json",
+                                params=params,
+                                headers=headers): (mod_id, file_id)
+                for mod_id, file_id in pairs
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def generate_download_urls(self,
+                               pairs: typing.Iterable[typing.Tuple[int, int]],
+                               game_domain: str = None,
+                               params: dict = None,
+                               headers: dict = None,
+                               max_workers: int = 16) -> typing.Iterator[str]:
+        """Generates the urls of several files to download concurrently.
+        Yields the url of the first mirror of every file as soon as its links
+        arrive, so it can be passed straight to FileDownloader.download_many.
+        Files, for which the links could not be generated, are logged and skipped.
+
+        Args:
+            pairs: iterable of (mod_id, file_id) tuples
+            game_domain: a domain of the game the mods are modifying. Example: "skyrim"
+            params: dictionary of parameters:values to pass to requests
+            headers: dictionary of headers:values to pass to requests
+            max_workers: maximum number of requests sent at the same time
+
+        Yields:
+            str url of a file
+        """
+        for (mod_id, file_id), response in self.generate_links(pairs,
+                                                               game_domain=game_domain,
+                                                               params=params,
+                                                               headers=headers,
+                                                               max_workers=max_workers):
+            if response.status_code != 200:
+                _log.warning("No download link for file %s of mod %s, status code %s.",
+                             file_id, mod_id, response.status_code)
+                continue
+            yield response.json()[0]["URI"]
+
     def generate_mod_info(self,
                           mod_id: typing.Union[int, typing.List[int]],
                           game_domain: str = None,
                           params: dict = None,
-                          headers: dict = None) -> typing.List[requests.Response]:
+                          headers: dict = None,
+                          max_workers: int = 16,
+                          mod_headers: typing.Iterable[dict] = None) -> typing.List[requests.Response]:
         """Attempts to get information about a specified mod.
         Attempts to download information about a mod specified by mod_id via
-        a HTTP GET request.
+        a HTTP GET request. Requests for several mods are sent concurrently.
 
         Args:
             game_domain: game domain specified by Nexus Mods site. Example: "skyrim"
             mod_id: mod id specified by Nexus Mods site
             params: parameters passed to GET request
             headers: headers passed to GET request
+            max_workers: maximum number of requests sent at the same time
+            mod_headers: headers of the request for every mod, in the order
+                of mod_id. Replace headers, for example to revalidate cached infos
 
         Returns:
             requests.Response
@@ -265,18 +535,43 @@ class ModFileQuery(NexusQuery):
         if headers is None:
             headers = self.headers
 
-        response_list = []
-        for single_id in mod_id:
-            # Creating a URL request
-            self.url = "games/{game_domain}/mods/{mod_id}.json".format(game_domain=game_domain,
-                                                                       mod_id=single_id)
-
-            # Executing the query
-            response: requests.Response = super(ModFileQuery, self).query(self.url,
-                                                                          params=params,
-                                                                          headers=headers)
-            assert isinstance(response, requests.Response), "response is not" \
-                                                           "a requests.Response object."
-            response_list.append(response)
-
-        return response_list
+        # Creating URL requests, only the mod id changes between them
+        prefix = f"games/{game_domain}/mods/"
+        urls = [f"{prefix}{single_id}.json" for single_id in mod_id]
+
+        # Executing the queries, the requests wait for the network concurrently
+        return self.query_many(urls,
+                               params=params,
+                               headers=headers,
+                               max_workers=max_workers,
+                               url_headers=mod_headers)
+
+    def list_updated(self,
+                     period: str = "1w",
+                     game_domain: str = None,
+                     params: dict = None,
+                     headers: dict = None) -> requests.Response:
+        """Requests the list of mods of a game updated within a period.
+        A single request covers all the mods of the game, each entry holds
+        the mod id and the timestamps of its latest file update and activity.
+
+        Args:
+            period: one of "1d", "1w" or "1m"
+            game_domain: a domain of the game. Example: "skyrim"
+            params: dictionary of parameters:values to pass to requests
+            headers: dictionary of headers:values to pass to requests
+
+        Returns:
+            requests.Response
+        """
+        if game_domain is None:
+            game_domain = self.game_domain
+        if params is None:
+            params = self.params
+        if headers is None:
+            headers = self.headers
+
+        url = f"games/{game_domain}/mods/updated.json"
+        params = dict(params or {}, period=period)
+
+        return self.query(url, params=params, headers=headers)